@@ -1,20 +1,17 @@
 """
 API routes for the transcription service.
 """
-import json
-import time
 import logging
 from pathlib import Path
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Request
+from fastapi.responses import FileResponse
 
 from app.core.config import get_settings
 from app.schemas.models import TranscriptionResponse, ErrorResponse, HealthResponse
 from app.services.audio_processor import AudioProcessor, AudioProcessingError
 from app.services.transcription import TranscriptionService
 from app.services.diarization import DiarizationService
-from app.services.alignment import AlignmentService
 from app.services.orchestrator import PipelineOrchestrator
 
 logger = logging.getLogger(__name__)
@@ -33,12 +30,9 @@ async def health_check():
     )
 
 
-from fastapi.responses import FileResponse, StreamingResponse
-
-# ... (rest of imports)
-
 @router.post("/api/transcribe", response_model=TranscriptionResponse)
 async def transcribe_audio(
+    request: Request,
     background_tasks: BackgroundTasks,
     file: UploadFile = File(..., description="Audio file to transcribe")
 ):
@@ -49,24 +43,25 @@ async def transcribe_audio(
     wav_path = None
     
     try:
-        # Read file content
-        file_content = await file.read()
+        filename = file.filename or "audio.wav"
         
-        # Validate and process audio
+        # Validate (type and size) and copy upload to disk
         try:
-            AudioProcessor.validate_file(file.filename or "audio.wav", len(file_content))
+            original_path = await AudioProcessor.save_upload(file, filename)
         except AudioProcessingError as e:
             raise HTTPException(status_code=400, detail=str(e))
         
-        # Save and convert to WAV (Noise reduction happens here)
-        wav_path, duration = await AudioProcessor.process_upload(
-            file_content, 
-            file.filename or "audio.wav"
-        )
+        # Convert to WAV (Noise reduction happens here)
+        wav_path, duration = await AudioProcessor.process_upload(original_path)
         
         # Run orchestrated pipeline (Whisper + Pyannote in parallel -> Alignment)
         logger.info("Executing orchestrated pipeline...")
-        response = await PipelineOrchestrator.process_audio(wav_path, duration)
+        async with request.app.state.pipeline_semaphore:
+            response = await PipelineOrchestrator.process_audio(
+                wav_path,
+                duration,
+                executor=request.app.state.pipeline_executor
+            )
         
         # Schedule cleanup in background
         background_tasks.add_task(cleanup_files, wav_path)
@@ -102,8 +97,7 @@ async def download_file(filename: str, background_tasks: BackgroundTasks):
     # Determine media type
     media_type = "text/plain" if filename.endswith('.txt') else "application/x-subrip"
     
-    # Schedule cleanup after download (give some time for download to complete)
-    # Note: In production, you might want a separate cleanup job
+    # Files stay downloadable until the transcript sweep removes them (TRANSCRIPT_TTL_S)
     
     return FileResponse(
         path=filepath,
@@ -113,10 +107,5 @@ async def download_file(filename: str, background_tasks: BackgroundTasks):
 
 
 async def cleanup_files(*paths: Path):
-    """Background task to cleanup temporary files."""
-    import asyncio
-    
-    # Wait a bit before cleanup to ensure files are not in use
-    await asyncio.sleep(5)
-    
+    """Background task to cleanup temporary files (runs after the response is sent)."""
     await AudioProcessor.cleanup_files(*paths)
@@ -3,7 +3,7 @@ Application configuration using Pydantic Settings.
 """
 import os
 from pathlib import Path
-from functools import lru_cache
+from functools import lru_cache, cached_property
 from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -25,10 +25,17 @@ class Settings(BaseSettings):
     # Model settings
     whisper_model: str = "kiendt/PhoWhisper-large-ct2"
     diarization_model: str = "pyannote/speaker-diarization-3.1"
+    diarization_fp16: bool = False  # Experimental FP16 autocast for pyannote on CUDA (embedding fbank can overflow)
     
     # Device settings
     device: Literal["cuda", "cpu", "auto"] = "auto"
-    compute_type: str = "float16"  # float16 for GPU, int8 for CPU
+    compute_type: str = "auto"  # auto: int8_float16 on GPU (SM >= 7.5), int8 on CPU
+    whisper_num_workers: int = 2  # Concurrent transcribe calls sharing one set of weights
+    whisper_batch_size: int = 16  # VAD chunks per batched forward pass (1 = sequential decoding)
+    whisper_beam_size: int = 1  # Greedy by default; 5 for quality mode
+    
+    # Concurrency: pipeline runs allowed at once on CPU (CUDA always uses 1)
+    cpu_workers: int = 2
     
     # Upload settings
     max_upload_size_mb: int = 100
@@ -47,10 +54,21 @@ class Settings(BaseSettings):
     vad_min_speech_duration_ms: int = 250
     vad_min_silence_duration_ms: int = 500
     
+    # Sharding: split long audio at silences and transcribe shards in parallel
+    shard_duration_s: float = 600.0  # 0 disables sharding
+    silence_noise_db: float = -35.0  # Frame RMS level (dBFS) treated as silence
+    
+    # Diarization-first mode: run pyannote before Whisper and transcribe only its speech regions
+    transcribe_speech_regions: bool = False
+    speech_region_gap_s: float = 0.3  # Bridge gaps shorter than this between regions
+    
     # Post-processing
     merge_threshold_s: float = 0.5  # Merge segments from same speaker if gap < this
     min_segment_duration_s: float = 0.3  # Remove segments shorter than this
     
+    # Generated TXT/SRT files are deleted this long after they are written
+    transcript_ttl_s: float = 3600.0
+    
     # Server settings
     host: str = "0.0.0.0"
     port: int = 7860
@@ -61,19 +79,13 @@ class Settings(BaseSettings):
     upload_dir: Path = data_dir / "uploads"
     processed_dir: Path = data_dir / "processed"
     
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        # Ensure directories exist
-        self.upload_dir.mkdir(parents=True, exist_ok=True)
-        self.processed_dir.mkdir(parents=True, exist_ok=True)
-    
     @property
     def max_upload_size_bytes(self) -> int:
         return self.max_upload_size_mb * 1024 * 1024
     
-    @property
+    @cached_property
     def resolved_device(self) -> str:
-        """Resolve 'auto' to actual device."""
+        """Resolve 'auto' to actual device (probed once, then cached)."""
         if self.device == "auto":
             try:
                 import torch
@@ -82,10 +94,19 @@ class Settings(BaseSettings):
                 return "cpu"
         return self.device
     
-    @property
+    @cached_property
     def resolved_compute_type(self) -> str:
-        """Get appropriate compute type for device."""
+        """Get appropriate compute type for device ('auto' picks a quantized type)."""
+        if self.compute_type != "auto":
+            return self.compute_type
         if self.resolved_device == "cuda":
+            try:
+                import torch
+                # INT8 weights with FP16 activations need tensor cores (Turing or newer)
+                if torch.cuda.get_device_capability() >= (7, 5):
+                    return "int8_float16"
+            except Exception:
+                pass
             return "float16"
         return "int8"
 
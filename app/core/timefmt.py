@@ -0,0 +1,23 @@
+"""
+Timestamp formatting shared by API models and transcript exporters.
+"""
+from typing import Tuple
+
+
+def fmt_hms(seconds: float) -> str:
+    """Convert seconds to HH:MM:SS format."""
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+
+
+def fmt_ms(seconds: float) -> str:
+    """Convert seconds to SRT HH:MM:SS,mmm format."""
+    return fmt_both(seconds)[1]
+
+
+def fmt_both(seconds: float) -> Tuple[str, str]:
+    """Format seconds as both HH:MM:SS and HH:MM:SS,mmm from one divmod chain."""
+    hms = fmt_hms(seconds)
+    millis = int((seconds - int(seconds)) * 1000)
+    return hms, f"{hms},{millis:03d}"
@@ -3,19 +3,24 @@ PrecisionVoice - Speech-to-Text & Speaker Diarization Application
 
 Main FastAPI application entry point.
 """
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
+import fastapi
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse
 
 from app.core.config import get_settings
 from app.api.routes import router
 from app.services.transcription import TranscriptionService
 from app.services.diarization import DiarizationService
+from app.services.audio_processor import AudioProcessor
+from app.services.alignment_kernels import warm_split_kernel
 
 # Configure logging
 logging.basicConfig(
@@ -26,6 +31,24 @@ logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
+# FastAPI >= 0.130 serializes response models straight to JSON bytes in pydantic-core,
+# but only while no custom response class is set (ORJSONResponse is deprecated there).
+# Older versions build a dict and json.dumps it, so orjson is the faster encoder.
+_NATIVE_JSON = tuple(int(part) for part in fastapi.__version__.split(".")[:2]) >= (0, 130)
+
+# How often expired transcripts are looked for (seconds)
+TRANSCRIPT_SWEEP_INTERVAL_S = 600
+
+
+async def sweep_transcripts() -> None:
+    """Periodically delete TXT/SRT files older than settings.transcript_ttl_s."""
+    while True:
+        try:
+            await AudioProcessor.purge_stale_transcripts(settings.transcript_ttl_s)
+        except Exception as e:
+            logger.warning(f"Transcript sweep failed: {e}")
+        await asyncio.sleep(max(1.0, min(TRANSCRIPT_SWEEP_INTERVAL_S, settings.transcript_ttl_s)))
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -38,27 +61,55 @@ async def lifespan(app: FastAPI):
     logger.info(f"Whisper model: {settings.whisper_model}")
     logger.info(f"Diarization model: {settings.diarization_model}")
     
-    # Preload models (optional - can be disabled for faster startup)
-    try:
-        logger.info("Preloading Whisper model...")
-        TranscriptionService.preload_model()
-    except Exception as e:
-        logger.error(f"Failed to preload Whisper model: {e}")
+    # Ensure data directories exist (once per process, not per Settings instance)
+    settings.upload_dir.mkdir(parents=True, exist_ok=True)
+    settings.processed_dir.mkdir(parents=True, exist_ok=True)
+    
+    # Preload models concurrently (optional - can be disabled for faster startup)
+    # Both loads are mostly disk reads and native init, so they overlap well in threads;
+    # the Numba alignment kernel compiles alongside instead of in the first request
+    preloads = [
+        asyncio.to_thread(warm_split_kernel),
+        asyncio.to_thread(TranscriptionService.preload_model)
+    ]
+    if settings.hf_token:
+        preloads.append(asyncio.to_thread(DiarizationService.preload_pipeline))
+    else:
+        logger.warning("HF_TOKEN not set, diarization will not be available")
+    
+    logger.info("Preloading models...")
+    kernel_result, whisper_result, *diarization_result = await asyncio.gather(*preloads, return_exceptions=True)
+    if isinstance(kernel_result, Exception):
+        logger.warning(f"Failed to compile alignment kernel (will try again on first use): {kernel_result}")
+    if isinstance(whisper_result, Exception):
+        logger.error(f"Failed to preload Whisper model: {whisper_result}")
+    if diarization_result and isinstance(diarization_result[0], Exception):
+        logger.warning(f"Diarization preload failed (will try again on first use): {diarization_result[0]}")
+    
+    # Make sure weights are resident on the GPU before accepting traffic
+    if settings.resolved_device == "cuda":
+        import torch
+        torch.cuda.synchronize()
+    
+    # Bound concurrent pipeline runs: one at a time on GPU to avoid VRAM thrash
+    pipeline_workers = 1 if settings.resolved_device == "cuda" else settings.cpu_workers
+    app.state.pipeline_semaphore = asyncio.Semaphore(pipeline_workers)
+    app.state.pipeline_executor = ThreadPoolExecutor(
+        max_workers=pipeline_workers,
+        thread_name_prefix="pipeline"
+    )
+    logger.info(f"Pipeline concurrency: {pipeline_workers}")
     
-    try:
-        if settings.hf_token:
-            logger.info("Preloading diarization pipeline...")
-            DiarizationService.preload_pipeline()
-        else:
-            logger.warning("HF_TOKEN not set, diarization will not be available")
-    except Exception as e:
-        logger.warning(f"Diarization preload failed (will try again on first use): {e}")
+    # Transcripts stay downloadable (repeatedly) until they expire
+    sweeper = asyncio.create_task(sweep_transcripts())
     
     logger.info("Application startup complete")
     
     yield
     
     logger.info("Shutting down PrecisionVoice application...")
+    sweeper.cancel()
+    app.state.pipeline_executor.shutdown(wait=False)
 
 
 # Create FastAPI app
@@ -66,7 +117,8 @@ app = FastAPI(
     title="PrecisionVoice",
     description="Speech-to-Text and Speaker Diarization API",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    **({} if _NATIVE_JSON else {"default_response_class": ORJSONResponse})
 )
 
 # CORS middleware
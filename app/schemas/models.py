@@ -1,7 +1,7 @@
 """
 Pydantic models for API requests and responses.
 """
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional
 from enum import Enum
 
@@ -15,29 +15,16 @@ class ProcessingStatus(str, Enum):
 
 
 class TranscriptSegment(BaseModel):
-    """A single segment of the transcript with speaker and timing."""
+    """
+    A single segment of the transcript with speaker and timing.
+    Built from trusted pipeline data via model_construct (no validation).
+    """
+    model_config = ConfigDict(validate_assignment=False, extra="ignore")
+    
     start: float = Field(..., description="Start time in seconds")
     end: float = Field(..., description="End time in seconds")
     speaker: str = Field(..., description="Speaker identifier")
     text: str = Field(..., description="Transcribed text")
-    
-    @property
-    def start_formatted(self) -> str:
-        """Format start time as HH:MM:SS."""
-        return self._format_time(self.start)
-    
-    @property
-    def end_formatted(self) -> str:
-        """Format end time as HH:MM:SS."""
-        return self._format_time(self.end)
-    
-    @staticmethod
-    def _format_time(seconds: float) -> str:
-        """Convert seconds to HH:MM:SS format."""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        return f"{hours:02d}:{minutes:02d}:{secs:02d}"
 
 
 class TranscriptionRequest(BaseModel):
@@ -49,6 +36,8 @@ class TranscriptionRequest(BaseModel):
 
 class TranscriptionResponse(BaseModel):
     """Response containing the transcription results."""
+    model_config = ConfigDict(validate_assignment=False, extra="ignore")
+    
     success: bool = Field(..., description="Whether transcription succeeded")
     message: str = Field(default="", description="Status message")
     segments: list[TranscriptSegment] = Field(default_factory=list, description="Transcript segments with speakers")
@@ -4,25 +4,41 @@ Merges word-level transcription with speaker diarization using precise timestamp
 """
 import logging
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import List, Tuple
 from dataclasses import dataclass
 
+import numpy as np
+
 from app.core.config import get_settings
+from app.core.timefmt import fmt_hms, fmt_ms, fmt_both
 from app.schemas.models import TranscriptSegment
-from app.services.transcription import WordTimestamp
-from app.services.diarization import SpeakerSegment
+from app.services.transcription import WordTimestamps
+from app.services.diarization import DiarizationResult
+from app.services.alignment_kernels import split_segments
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
 @dataclass
-class WordWithSpeaker:
-    """A word with assigned speaker."""
-    word: str
-    start: float
-    end: float
-    speaker: str
+class WordsSoA:
+    """Words with assigned speakers, stored column-wise (one array per field)."""
+    words: List[str]
+    starts: np.ndarray
+    ends: np.ndarray
+    speaker_ids: np.ndarray  # Index into id_to_label
+    id_to_label: List[str]
+
+
+@dataclass
+class SpeakerTimeline:
+    """Speaker segments sorted by start time, stored as parallel arrays."""
+    starts: np.ndarray
+    ends: np.ndarray
+    reach: np.ndarray  # Latest end time among segments[:i + 1]
+    cover: np.ndarray  # Index of the first segment reaching that end time
+    speaker_ids: np.ndarray  # Integer speaker code per segment
+    labels: List[str]  # Speaker label for each code
 
 
 class AlignmentService:
@@ -34,123 +50,179 @@ class AlignmentService:
     # Pause threshold for splitting segments (seconds)
     PAUSE_THRESHOLD = 1.0
     
-    @staticmethod
-    def get_word_center(word: WordTimestamp) -> float:
-        """Calculate the center time of a word."""
-        return (word.start + word.end) / 2
+    # Margin around the transcribed span when pre-filtering speaker segments (seconds)
+    PREFILTER_MARGIN = 1.0
     
-    @classmethod
-    def find_speaker_at_time(
-        cls,
-        time: float,
-        speaker_segments: List[SpeakerSegment]
-    ) -> Optional[str]:
+    # Write buffer for transcript files (bytes)
+    WRITE_BUFFER_SIZE = 1 << 20
+    
+    @staticmethod
+    def build_timeline(diarization: DiarizationResult) -> SpeakerTimeline:
         """
-        Find which speaker is speaking at a given time.
+        Lay out diarization turns as sorted arrays for vectorized lookups.
         
         Args:
-            time: Time point in seconds
-            speaker_segments: List of speaker segments from diarization
+            diarization: Diarization result (its sorted arrays are cached)
             
         Returns:
-            Speaker label or None if no speaker found
+            SpeakerTimeline ready for locate_speakers
         """
-        for seg in speaker_segments:
-            if seg.start <= time <= seg.end:
-                return seg.speaker
-        return None
+        ends = diarization.sorted_ends
+        
+        # Track the segment reaching furthest in time so far, so overlapping
+        # turns that started earlier are still found by a single search.
+        reach = np.maximum.accumulate(ends)
+        cover = np.searchsorted(reach, reach, side="left")
+        
+        return SpeakerTimeline(
+            starts=diarization.sorted_starts,
+            ends=ends,
+            reach=reach,
+            cover=cover,
+            speaker_ids=diarization.sorted_speaker_ids,
+            labels=diarization.labels
+        )
     
     @classmethod
-    def find_closest_speaker(
+    def clip_timeline(
         cls,
-        time: float,
-        speaker_segments: List[SpeakerSegment]
-    ) -> str:
+        timeline: SpeakerTimeline,
+        window_start: float,
+        window_end: float
+    ) -> SpeakerTimeline:
         """
-        Find the closest speaker to a given time (for gaps/silence).
+        Keep only the part of the timeline that can matter for [window_start, window_end].
+        
+        Turns that end before the window are dropped except the latest-ending
+        one, and turns after the window are dropped except the first one, so
+        closest-speaker fallback still gives the same answer.
         
         Args:
-            time: Time point in seconds
-            speaker_segments: List of speaker segments
+            timeline: Full speaker timeline
+            window_start: Earliest time of interest in seconds
+            window_end: Latest time of interest in seconds
             
         Returns:
-            Closest speaker label or "Unknown"
+            Timeline sliced to the window
+        """
+        n_segments = len(timeline.starts)
+        
+        # reach is non-decreasing: everything before lo ends before the window
+        lo = int(np.searchsorted(timeline.reach, window_start, side="left"))
+        first = int(timeline.cover[lo - 1]) if lo > 0 else 0
+        stop = int(np.searchsorted(timeline.starts, window_end, side="right")) + 1
+        
+        if first == 0 and stop >= n_segments:
+            return timeline
+        
+        logger.info(f"Pre-filtered speaker segments: {n_segments} -> {min(stop, n_segments) - first}")
+        window = slice(first, stop)
+        return SpeakerTimeline(
+            starts=timeline.starts[window],
+            ends=timeline.ends[window],
+            reach=timeline.reach[window],
+            cover=timeline.cover[window] - first,
+            speaker_ids=timeline.speaker_ids[window],
+            labels=timeline.labels
+        )
+    
+    @staticmethod
+    def locate_speakers(centers: np.ndarray, timeline: SpeakerTimeline) -> np.ndarray:
         """
-        if not speaker_segments:
-            return "Unknown"
+        Find the segment index responsible for each time point.
         
-        min_distance = float('inf')
-        closest_speaker = "Unknown"
+        Matches a scan over the segments in start order: a time point inside
+        one or more (overlapping) segments gets the earliest-starting of them,
+        and a time point in a gap gets the segment with the closest edge,
+        the earlier one on ties. Only the latest-ending segment before the
+        point and the first segment after it can be closest.
         
-        for seg in speaker_segments:
-            # Distance to segment start or end
-            dist_to_start = abs(time - seg.start)
-            dist_to_end = abs(time - seg.end)
-            min_seg_dist = min(dist_to_start, dist_to_end)
+        Args:
+            centers: Time points in seconds
+            timeline: Sorted speaker segments from build_timeline
             
-            if min_seg_dist < min_distance:
-                min_distance = min_seg_dist
-                closest_speaker = seg.speaker
+        Returns:
+            Array of segment indices into the timeline
+        """
+        n_segments = len(timeline.starts)
+        
+        idx = np.searchsorted(timeline.starts, centers, side="right") - 1
+        prev = np.maximum(idx, 0)
+        
+        # Inside a segment: the first segment whose end reaches the point has
+        # started before it (index <= idx) exactly when some segment covers it
+        first_cover = np.searchsorted(timeline.reach, centers, side="left")
+        in_range = (idx >= 0) & (first_cover <= idx)
+        result = np.where(in_range, first_cover, 0)
         
-        return closest_speaker
+        # In a gap: compare distance to the previous end and the next start,
+        # computed only for the (usually few) words outside every segment
+        out_idx = np.flatnonzero(~in_range)
+        if out_idx.size:
+            gap_centers = centers[out_idx]
+            gap_idx = idx[out_idx]
+            gap_prev = prev[out_idx]
+            nxt = np.minimum(gap_idx + 1, n_segments - 1)
+            dist_prev = np.where(gap_idx >= 0, gap_centers - timeline.reach[gap_prev], np.inf)
+            dist_next = np.where(gap_idx + 1 < n_segments, timeline.starts[nxt] - gap_centers, np.inf)
+            result[out_idx] = np.where(dist_next < dist_prev, nxt, timeline.cover[gap_prev])
+        
+        return result
     
     @classmethod
     def assign_speakers_to_words(
         cls,
-        words: List[WordTimestamp],
-        speaker_segments: List[SpeakerSegment]
-    ) -> List[WordWithSpeaker]:
+        words: WordTimestamps,
+        diarization: DiarizationResult
+    ) -> WordsSoA:
         """
         Step 3c: Assign speakers to each word based on word center time.
         
         Args:
-            words: List of words with timestamps from transcription
-            speaker_segments: List of speaker segments from diarization
+            words: Words with timestamps from transcription
+            diarization: Speaker segments from diarization
             
         Returns:
-            List of words with speaker assignments
+            WordsSoA with a speaker id per word
         """
-        if not speaker_segments:
+        n_words = len(words)
+        
+        if not len(diarization):
             # No diarization available, assign all to "Speaker 1"
             logger.warning("No speaker segments available, using single speaker")
-            return [
-                WordWithSpeaker(
-                    word=w.word,
-                    start=w.start,
-                    end=w.end,
-                    speaker="Speaker 1"
-                )
-                for w in words
-            ]
-        
-        words_with_speakers = []
-        
-        for word in words:
-            # Calculate word center time
-            center_time = cls.get_word_center(word)
-            
-            # Find speaker at this time
-            speaker = cls.find_speaker_at_time(center_time, speaker_segments)
-            
-            # If no direct match, find closest speaker
-            if speaker is None:
-                speaker = cls.find_closest_speaker(center_time, speaker_segments)
-            
-            words_with_speakers.append(WordWithSpeaker(
-                word=word.word,
-                start=word.start,
-                end=word.end,
-                speaker=speaker
-            ))
+            return WordsSoA(
+                words=words.words,
+                starts=words.starts,
+                ends=words.ends,
+                speaker_ids=np.zeros(n_words, dtype=np.int64),
+                id_to_label=["Speaker 1"]
+            )
+        
+        timeline = cls.build_timeline(diarization)
         
-        logger.info(f"Assigned speakers to {len(words_with_speakers)} words")
-        return words_with_speakers
+        # Drop diarization turns far outside the transcribed span
+        if n_words:
+            timeline = cls.clip_timeline(
+                timeline,
+                words.starts.min() - cls.PREFILTER_MARGIN,
+                words.ends.max() + cls.PREFILTER_MARGIN
+            )
+        
+        # Resolve all words in one batch on word center times
+        centers = 0.5 * (words.starts + words.ends)
+        speaker_ids = timeline.speaker_ids[cls.locate_speakers(centers, timeline)]
+        
+        logger.info(f"Assigned speakers to {n_words} words")
+        return WordsSoA(
+            words=words.words,
+            starts=words.starts,
+            ends=words.ends,
+            speaker_ids=speaker_ids,
+            id_to_label=timeline.labels
+        )
     
     @classmethod
-    def reconstruct_segments(
-        cls,
-        words_with_speakers: List[WordWithSpeaker]
-    ) -> List[TranscriptSegment]:
+    def reconstruct_segments(cls, words: WordsSoA) -> List[TranscriptSegment]:
         """
         Step 3d: Reconstruct sentence segments from words.
         
@@ -160,62 +232,32 @@ class AlignmentService:
         - Pause > PAUSE_THRESHOLD between words
         
         Args:
-            words_with_speakers: List of words with speaker assignments
+            words: Words with speaker assignments
             
         Returns:
             List of TranscriptSegment with complete sentences
         """
-        if not words_with_speakers:
+        n_words = len(words.words)
+        if not n_words:
             return []
         
-        segments = []
+        boundaries = split_segments(words.starts, words.ends, words.speaker_ids, cls.PAUSE_THRESHOLD).tolist()
+        boundaries.append(n_words)
         
-        # Start first segment
-        current_speaker = words_with_speakers[0].speaker
-        current_start = words_with_speakers[0].start
-        current_end = words_with_speakers[0].end
-        current_words = [words_with_speakers[0].word]
+        starts = words.starts.tolist()
+        ends = words.ends.tolist()
+        speaker_ids = words.speaker_ids.tolist()
         
-        for i in range(1, len(words_with_speakers)):
-            word = words_with_speakers[i]
-            prev_word = words_with_speakers[i - 1]
-            
-            # Calculate pause between words
-            pause = word.start - prev_word.end
-            
-            # Check if we need to start a new segment
-            speaker_changed = word.speaker != current_speaker
-            significant_pause = pause > cls.PAUSE_THRESHOLD
-            
-            if speaker_changed or significant_pause:
-                # Save current segment
-                segments.append(TranscriptSegment(
-                    start=current_start,
-                    end=current_end,
-                    speaker=current_speaker,
-                    text=" ".join(current_words)
-                ))
-                
-                # Start new segment
-                current_speaker = word.speaker
-                current_start = word.start
-                current_end = word.end
-                current_words = [word.word]
-            else:
-                # Continue current segment
-                current_end = word.end
-                current_words.append(word.word)
-        
-        # Don't forget the last segment
-        if current_words:
-            segments.append(TranscriptSegment(
-                start=current_start,
-                end=current_end,
-                speaker=current_speaker,
-                text=" ".join(current_words)
+        segments = []
+        for first, stop in zip(boundaries[:-1], boundaries[1:]):
+            segments.append(TranscriptSegment.model_construct(
+                start=starts[first],
+                end=ends[stop - 1],
+                speaker=words.id_to_label[speaker_ids[first]],
+                text=" ".join(words.words[first:stop])
             ))
         
-        logger.info(f"Reconstructed {len(segments)} segments from {len(words_with_speakers)} words")
+        logger.info(f"Reconstructed {len(segments)} segments from {n_words} words")
         return segments
     
     @classmethod
@@ -259,21 +301,21 @@ class AlignmentService:
     @classmethod
     def align_precision(
         cls,
-        words: List[WordTimestamp],
-        speaker_segments: List[SpeakerSegment]
+        words: WordTimestamps,
+        diarization: DiarizationResult
     ) -> List[TranscriptSegment]:
         """
         Full precision alignment pipeline.
         
         Args:
             words: Word-level timestamps from transcription
-            speaker_segments: Speaker segments from diarization
+            diarization: Speaker segments from diarization
             
         Returns:
             List of TranscriptSegment with proper speaker assignments
         """
         # Step 3c: Assign speakers to words
-        words_with_speakers = cls.assign_speakers_to_words(words, speaker_segments)
+        words_with_speakers = cls.assign_speakers_to_words(words, diarization)
         
         # Step 3d: Reconstruct segments
         segments = cls.reconstruct_segments(words_with_speakers)
@@ -286,68 +328,44 @@ class AlignmentService:
     @staticmethod
     def format_timestamp_txt(seconds: float) -> str:
         """Format timestamp for TXT output: HH:MM:SS"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+        return fmt_hms(seconds)
     
     @staticmethod
     def format_timestamp_srt(seconds: float) -> str:
         """Format timestamp for SRT output: HH:MM:SS,mmm"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        millis = int((seconds % 1) * 1000)
-        return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
-    
-    @classmethod
-    def generate_txt(cls, segments: List[TranscriptSegment], output_path: Path) -> Path:
-        """
-        Generate TXT transcript file.
-        
-        Format: [HH:MM:SS - HH:MM:SS] Speaker: Text
-        """
-        lines = []
-        for seg in segments:
-            start = cls.format_timestamp_txt(seg.start)
-            end = cls.format_timestamp_txt(seg.end)
-            lines.append(f"[{start} - {end}] {seg.speaker}: {seg.text}")
-        
-        output_path.write_text("\n".join(lines), encoding="utf-8")
-        logger.info(f"Generated TXT: {output_path}")
-        
-        return output_path
-    
-    @classmethod
-    def generate_srt(cls, segments: List[TranscriptSegment], output_path: Path) -> Path:
-        """
-        Generate SRT subtitle file.
-        """
-        lines = []
-        for i, seg in enumerate(segments, 1):
-            start = cls.format_timestamp_srt(seg.start)
-            end = cls.format_timestamp_srt(seg.end)
-            lines.append(str(i))
-            lines.append(f"{start} --> {end}")
-            lines.append(f"[{seg.speaker}] {seg.text}")
-            lines.append("")  # Empty line between entries
-        
-        output_path.write_text("\n".join(lines), encoding="utf-8")
-        logger.info(f"Generated SRT: {output_path}")
-        
-        return output_path
+        return fmt_ms(seconds)
     
     @classmethod
     def generate_outputs(
         cls,
         segments: List[TranscriptSegment],
         base_filename: str
-    ) -> Tuple[Path, Path]:
-        """Generate both TXT and SRT output files."""
+    ) -> Tuple[Path, Path, int]:
+        """
+        Generate both TXT and SRT output files in a single pass.
+        
+        TXT format: [HH:MM:SS - HH:MM:SS] Speaker: Text
+        SRT format: numbered cues with HH:MM:SS,mmm timestamps
+        
+        Returns:
+            Tuple of (TXT path, SRT path, number of distinct speakers)
+        """
         txt_path = settings.processed_dir / f"{base_filename}.txt"
         srt_path = settings.processed_dir / f"{base_filename}.srt"
         
-        cls.generate_txt(segments, txt_path)
-        cls.generate_srt(segments, srt_path)
+        speakers = set()
+        with open(txt_path, "w", encoding="utf-8", buffering=cls.WRITE_BUFFER_SIZE) as txt_file, \
+                open(srt_path, "w", encoding="utf-8", buffering=cls.WRITE_BUFFER_SIZE) as srt_file:
+            for i, seg in enumerate(segments, 1):
+                start_txt, start_srt = fmt_both(seg.start)
+                end_txt, end_srt = fmt_both(seg.end)
+                sep = "\n" if i > 1 else ""  # Blank line between SRT entries
+                
+                txt_file.write(f"{sep}[{start_txt} - {end_txt}] {seg.speaker}: {seg.text}")
+                srt_file.write(f"{sep}{i}\n{start_srt} --> {end_srt}\n[{seg.speaker}] {seg.text}\n")
+                speakers.add(seg.speaker)
+        
+        logger.info(f"Generated TXT: {txt_path}")
+        logger.info(f"Generated SRT: {srt_path}")
         
-        return txt_path, srt_path
+        return txt_path, srt_path, len(speakers)
@@ -0,0 +1,91 @@
+"""
+Numeric kernels for the alignment service.
+Compiled with Numba when available, with a NumPy fallback otherwise.
+"""
+import logging
+from functools import lru_cache
+from typing import Callable
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _split_segments(
+    starts: np.ndarray,
+    ends: np.ndarray,
+    speaker_ids: np.ndarray,
+    pause_threshold: float
+) -> np.ndarray:
+    """
+    Find the word indices where a new transcript segment begins.
+
+    A new segment starts on the first word, whenever the speaker changes,
+    and whenever the pause since the previous word exceeds pause_threshold.
+    """
+    n = starts.shape[0]
+    boundaries = np.empty(n, np.int64)
+    if n == 0:
+        return boundaries
+
+    boundaries[0] = 0
+    count = 1
+    for i in range(1, n):
+        if speaker_ids[i] != speaker_ids[i - 1] or starts[i] - ends[i - 1] > pause_threshold:
+            boundaries[count] = i
+            count += 1
+
+    return boundaries[:count]
+
+
+def _split_segments_numpy(
+    starts: np.ndarray,
+    ends: np.ndarray,
+    speaker_ids: np.ndarray,
+    pause_threshold: float
+) -> np.ndarray:
+    """Vectorized equivalent of _split_segments for installs without Numba."""
+    if starts.shape[0] == 0:
+        return np.empty(0, np.int64)
+
+    splits = (speaker_ids[1:] != speaker_ids[:-1]) | (starts[1:] - ends[:-1] > pause_threshold)
+    return np.concatenate(([0], np.flatnonzero(splits) + 1)).astype(np.int64)
+
+
+@lru_cache(maxsize=None)
+def _load_split_kernel() -> Callable[..., np.ndarray]:
+    """Compile the split kernel on first use (numba is optional)."""
+    try:
+        from numba import njit
+    except ImportError:
+        logger.info("Numba not installed, using NumPy segment splitting")
+        return _split_segments_numpy
+
+    return njit(cache=True)(_split_segments)
+
+
+def split_segments(
+    starts: np.ndarray,
+    ends: np.ndarray,
+    speaker_ids: np.ndarray,
+    pause_threshold: float
+) -> np.ndarray:
+    """
+    Compute segment boundaries for a word stream.
+
+    Args:
+        starts: Word start times (float64)
+        ends: Word end times (float64)
+        speaker_ids: Integer speaker code per word
+        pause_threshold: Pause in seconds that forces a new segment
+
+    Returns:
+        Sorted array of word indices where each segment begins
+    """
+    kernel = _load_split_kernel()
+    return kernel(starts, ends, speaker_ids, pause_threshold)
+
+
+def warm_split_kernel() -> None:
+    """Compile the split kernel for the dtypes alignment uses, ahead of the first request."""
+    split_segments(np.zeros(2), np.zeros(2), np.zeros(2, dtype=np.int64), 1.0)
@@ -3,19 +3,32 @@ Audio processing service using FFmpeg.
 Handles file validation, conversion to 16kHz mono WAV, and cleanup.
 """
 import os
-import uuid
+import time
 import asyncio
+import itertools
+import shutil
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
 import ffmpeg
+import numpy as np
+import soundfile as sf
+import soxr
+from fastapi import UploadFile
 
 from app.core.config import get_settings
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# FFmpeg/ffprobe and decode work, kept apart from model inference threads
+_FFMPEG_EXEC = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="ffmpeg")
+
+# Per-process upload sequence number (see AudioProcessor._new_upload_id)
+_UPLOAD_SEQ = itertools.count()
+
 
 class AudioProcessingError(Exception):
     """Custom exception for audio processing errors."""
@@ -28,6 +41,9 @@ class AudioProcessor:
     ALLOWED_EXTENSIONS = settings.allowed_extensions
     TARGET_SAMPLE_RATE = settings.sample_rate
     TARGET_CHANNELS = settings.channels
+    UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB copy buffer when saving uploads
+    
+    SILENCE_FRAME_MS = 20  # Frame length for RMS silence detection
     
     @classmethod
     def validate_file(cls, filename: str, file_size: int) -> bool:
@@ -60,34 +76,64 @@ class AudioProcessor:
         
         return True
     
+    @staticmethod
+    def _new_upload_id() -> str:
+        """
+        Collision-free upload ID without touching the OS random source.
+        
+        Wall-clock nanoseconds keep IDs unique across restarts, the PID
+        separates worker processes and the counter separates same-tick calls.
+        """
+        return f"{time.time_ns():x}-{os.getpid():x}-{next(_UPLOAD_SEQ):x}"
+    
     @classmethod
-    async def save_upload(cls, file_content: bytes, original_filename: str) -> Path:
+    async def save_upload(cls, file: UploadFile, original_filename: str) -> Path:
         """
-        Save uploaded file to temporary location.
+        Copy an uploaded file to a temporary location.
+        
+        Starlette has already spooled the request body, so the size is
+        checked by seeking to its end before anything is copied, and the
+        copy itself runs in one worker thread with a fixed-size buffer.
         
         Args:
-            file_content: File bytes
+            file: Uploaded file
             original_filename: Original filename for extension
             
         Returns:
             Path to saved file
+            
+        Raises:
+            AudioProcessingError: If the upload exceeds the size limit
         """
+        src = file.file
+        src.seek(0, os.SEEK_END)
+        size = src.tell()
+        src.seek(0)
+        cls.validate_file(original_filename, size)
+        
         ext = original_filename.rsplit('.', 1)[-1].lower() if '.' in original_filename else 'wav'
-        unique_id = str(uuid.uuid4())[:8]
+        unique_id = cls._new_upload_id()
         filename = f"{unique_id}.{ext}"
         filepath = settings.upload_dir / filename
         
-        # Write file asynchronously
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, lambda: filepath.write_bytes(file_content))
+        def copy() -> None:
+            with open(filepath, 'wb') as out:
+                shutil.copyfileobj(src, out, cls.UPLOAD_CHUNK_SIZE)
+        
+        try:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(_FFMPEG_EXEC, copy)
+        except Exception:
+            await cls.cleanup_files(filepath)
+            raise
         
-        logger.info(f"Saved upload: {filepath}")
+        logger.info(f"Saved upload: {filepath} ({size} bytes)")
         return filepath
     
     @classmethod
     async def convert_to_wav(cls, input_path: Path) -> Path:
         """
-        Convert audio to 16kHz mono WAV using FFmpeg.
+        Convert audio to 16kHz mono WAV (in-process when possible, else FFmpeg).
         
         Args:
             input_path: Path to input audio file
@@ -95,13 +141,29 @@ class AudioProcessor:
         Returns:
             Path to converted WAV file
         """
+        return await cls._convert(input_path, cls._probe_in_process(input_path))
+    
+    @classmethod
+    async def _convert(cls, input_path: Path, info: Optional["sf._SoundFileInfo"]) -> Path:
+        """Convert using a header probe from _probe_in_process (None: FFmpeg only)."""
         output_filename = f"{input_path.stem}_processed.wav"
         output_path = settings.processed_dir / output_filename
         
+        loop = asyncio.get_event_loop()
+        
+        # No FFmpeg filters to apply: decode and resample in-process, skipping the subprocess
+        if info is not None:
+            try:
+                await loop.run_in_executor(_FFMPEG_EXEC, lambda: cls._convert_in_process(input_path, output_path))
+                logger.info(f"Converted to WAV in-process: {output_path}")
+                return output_path
+            except Exception as e:
+                # Valid header but undecodable body (truncated/corrupt): FFmpeg is more tolerant
+                logger.warning(f"In-process conversion failed, falling back to FFmpeg: {e}")
+        
         try:
             # Run ffmpeg conversion in executor to not block
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, lambda: cls._run_ffmpeg_conversion(input_path, output_path))
+            await loop.run_in_executor(_FFMPEG_EXEC, lambda: cls._run_ffmpeg_conversion(input_path, output_path))
             
             logger.info(f"Converted to WAV: {output_path}")
             return output_path
@@ -111,6 +173,62 @@ class AudioProcessor:
             logger.error(f"FFmpeg error: {error_msg}")
             raise AudioProcessingError(f"Audio conversion failed: {error_msg}")
     
+    @classmethod
+    def decode_to_tensor(cls, input_path: Path) -> np.ndarray:
+        """
+        Decode audio in-process to a 16kHz mono float32 array (blocking).
+        
+        Args:
+            input_path: Path to an audio file readable by libsndfile
+            
+        Returns:
+            Mono float32 samples at TARGET_SAMPLE_RATE
+        """
+        audio, sample_rate = sf.read(str(input_path), dtype='float32', always_2d=True)
+        audio = audio.mean(axis=1) if audio.shape[1] > 1 else audio[:, 0]
+        
+        if sample_rate != cls.TARGET_SAMPLE_RATE:
+            audio = soxr.resample(audio, sample_rate, cls.TARGET_SAMPLE_RATE, quality='HQ')
+        
+        return np.ascontiguousarray(audio, dtype=np.float32)
+    
+    @classmethod
+    async def decode_async(cls, input_path: Path) -> np.ndarray:
+        """Async wrapper for decode_to_tensor (runs in the FFmpeg thread pool)."""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(_FFMPEG_EXEC, lambda: cls.decode_to_tensor(input_path))
+    
+    @staticmethod
+    def _probe_in_process(input_path: Path) -> Optional["sf._SoundFileInfo"]:
+        """
+        Read the header with libsndfile when conversion needs no FFmpeg filters.
+        
+        Returns:
+            Header info, or None if filters are enabled or libsndfile cannot read the file
+        """
+        if settings.enable_loudnorm or settings.enable_noise_reduction:
+            return None
+        try:
+            return sf.info(str(input_path))
+        except RuntimeError:  # soundfile.LibsndfileError: format not supported
+            return None
+    
+    @classmethod
+    def _is_target_wav(cls, info: "sf._SoundFileInfo") -> bool:
+        """Check whether a probed file is already a WAV in the pipeline format (needs no conversion)."""
+        return (
+            info.format == 'WAV'
+            and info.samplerate == cls.TARGET_SAMPLE_RATE
+            and info.channels == cls.TARGET_CHANNELS
+            and info.subtype == 'PCM_16'
+        )
+    
+    @classmethod
+    def _convert_in_process(cls, input_path: Path, output_path: Path) -> None:
+        """Decode, downmix and resample with libsndfile + soxr, then write PCM16 WAV (blocking)."""
+        audio = cls.decode_to_tensor(input_path)
+        sf.write(str(output_path), audio, cls.TARGET_SAMPLE_RATE, subtype='PCM_16')
+    
     @staticmethod
     def _run_ffmpeg_conversion(input_path: Path, output_path: Path) -> None:
         """Run the actual FFmpeg conversion (blocking)."""
@@ -141,21 +259,104 @@ class AudioProcessor:
             .run(quiet=True, capture_stderr=True)
         )
     
+    @classmethod
+    async def split_on_silence(cls, audio: np.ndarray) -> List[Tuple[float, float]]:
+        """
+        Choose shard boundaries at silences for parallel transcription.
+        
+        Shards are at most settings.shard_duration_s long where a silence allows
+        it. Audio shorter than that (or sharding disabled) is a single shard.
+        
+        Args:
+            audio: Decoded 16kHz mono float32 waveform
+            
+        Returns:
+            List of (start, end) in seconds, in time order
+        """
+        duration = len(audio) / cls.TARGET_SAMPLE_RATE
+        max_len = settings.shard_duration_s
+        if max_len <= 0 or duration <= max_len:
+            return [(0.0, duration)]
+        
+        loop = asyncio.get_event_loop()
+        silences = await loop.run_in_executor(_FFMPEG_EXEC, lambda: cls._detect_silences(audio))
+        
+        bounds = [0.0] + cls._choose_cut_points(silences, duration, max_len) + [duration]
+        if len(bounds) > 2:
+            logger.info(f"Split {duration:.1f}s of audio into {len(bounds) - 1} shards at silences")
+        return list(zip(bounds[:-1], bounds[1:]))
+    
+    @classmethod
+    def _detect_silences(cls, audio: np.ndarray) -> List[float]:
+        """
+        Find silences from frame RMS level (blocking) and return their midpoints in seconds.
+        
+        A silence is a run of SILENCE_FRAME_MS frames below settings.silence_noise_db
+        lasting at least settings.vad_min_silence_duration_ms.
+        """
+        frame_len = cls.TARGET_SAMPLE_RATE * cls.SILENCE_FRAME_MS // 1000
+        n_frames = len(audio) // frame_len
+        if not n_frames:
+            return []
+        
+        # Row-wise sum of squares without materializing audio ** 2
+        frames = audio[:n_frames * frame_len].reshape(n_frames, frame_len)
+        power = np.einsum('ij,ij->i', frames, frames) / frame_len
+        threshold = 10.0 ** (settings.silence_noise_db / 10)  # dBFS -> mean power
+        silent = power < threshold
+        
+        # Start and end (exclusive) frame of every silent run
+        edges = np.diff(np.concatenate(([0], silent.view(np.int8), [0])))
+        run_starts = np.flatnonzero(edges == 1)
+        run_ends = np.flatnonzero(edges == -1)
+        
+        min_frames = settings.vad_min_silence_duration_ms / cls.SILENCE_FRAME_MS
+        keep = run_ends - run_starts >= min_frames
+        midpoints = (run_starts[keep] + run_ends[keep]) * (cls.SILENCE_FRAME_MS / 2000)
+        return midpoints.tolist()
+    
+    @staticmethod
+    def _choose_cut_points(silences: List[float], duration: float, max_len: float) -> List[float]:
+        """Pick the latest silence before each shard would exceed max_len."""
+        cuts = []
+        last_cut = 0.0
+        candidate = None
+        
+        for mid in silences:
+            if mid - last_cut > max_len and candidate is not None:
+                cuts.append(candidate)
+                last_cut = candidate
+            if mid > last_cut:
+                candidate = mid
+        
+        if duration - last_cut > max_len and candidate is not None and candidate > last_cut:
+            cuts.append(candidate)
+        
+        return cuts
+    
     @classmethod
     async def get_audio_duration(cls, filepath: Path) -> float:
         """
         Get audio file duration in seconds.
         
+        Files libsndfile can read (every converted WAV) are measured from
+        their header in-process; anything else falls back to ffprobe.
+        
         Args:
             filepath: Path to audio file
             
         Returns:
             Duration in seconds
         """
+        try:
+            return sf.info(str(filepath)).duration
+        except RuntimeError:  # soundfile.LibsndfileError: format not supported
+            pass
+        
         try:
             loop = asyncio.get_event_loop()
             probe = await loop.run_in_executor(
-                None, 
+                _FFMPEG_EXEC, 
                 lambda: ffmpeg.probe(str(filepath))
             )
             
@@ -166,6 +367,38 @@ class AudioProcessor:
             logger.warning(f"Could not probe audio duration: {e}")
             return 0.0
     
+    @classmethod
+    async def purge_stale_transcripts(cls, max_age_s: float) -> int:
+        """
+        Delete generated TXT/SRT files older than max_age_s.
+        
+        Args:
+            max_age_s: Age in seconds (by modification time) after which a file is deleted
+            
+        Returns:
+            Number of files deleted
+        """
+        def purge() -> int:
+            cutoff = time.time() - max_age_s
+            removed = 0
+            for pattern in ("*.txt", "*.srt"):
+                for filepath in settings.processed_dir.glob(pattern):
+                    try:
+                        if filepath.stat().st_mtime < cutoff:
+                            filepath.unlink()
+                            removed += 1
+                    except FileNotFoundError:
+                        pass
+                    except Exception as e:
+                        logger.warning(f"Failed to clean up {filepath}: {e}")
+            return removed
+        
+        loop = asyncio.get_event_loop()
+        removed = await loop.run_in_executor(_FFMPEG_EXEC, purge)
+        if removed:
+            logger.info(f"Purged {removed} expired transcript files")
+        return removed
+    
     @classmethod
     async def cleanup_files(cls, *filepaths: Path) -> None:
         """
@@ -183,26 +416,27 @@ class AudioProcessor:
                 logger.warning(f"Failed to clean up {filepath}: {e}")
     
     @classmethod
-    async def process_upload(cls, file_content: bytes, filename: str) -> Tuple[Path, float]:
+    async def process_upload(cls, original_path: Path) -> Tuple[Path, float]:
         """
-        Full upload processing pipeline: validate, save, convert.
+        Upload processing pipeline for a saved upload: convert, probe duration.
         
         Args:
-            file_content: Uploaded file bytes
-            filename: Original filename
+            original_path: Path of the saved upload (deleted once converted)
             
         Returns:
             Tuple of (processed WAV path, duration in seconds)
         """
-        # Validate
-        cls.validate_file(filename, len(file_content))
-        
-        # Save original
-        original_path = await cls.save_upload(file_content, filename)
-        
         try:
+            # One header probe decides both the fast paths below
+            info = cls._probe_in_process(original_path)
+            
+            # Already 16kHz mono PCM16 WAV: use the upload as-is
+            if info is not None and cls._is_target_wav(info):
+                logger.info(f"Upload is already 16kHz mono PCM16 WAV, skipping conversion: {original_path}")
+                return original_path, info.duration
+            
             # Convert to WAV
-            wav_path = await cls.convert_to_wav(original_path)
+            wav_path = await cls._convert(original_path, info)
             
             # Get duration
             duration = await cls.get_audio_duration(wav_path)
@@ -3,11 +3,16 @@ Speaker diarization service using pyannote.audio.
 Identifies speaker turns in audio files.
 """
 import os
+import asyncio
+import contextlib
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple, Union
 from dataclasses import dataclass
+from functools import cached_property
 
+import numpy as np
 import torch
 
 from app.core.config import get_settings
@@ -15,13 +20,87 @@ from app.core.config import get_settings
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Single worker: one pyannote run at a time avoids CUDA context thrash
+_DIARIZE_EXEC = ThreadPoolExecutor(max_workers=1, thread_name_prefix="diarize")
+
 
 @dataclass
-class SpeakerSegment:
-    """A segment of audio attributed to a specific speaker."""
-    start: float
-    end: float
-    speaker: str
+class DiarizationResult:
+    """
+    Speaker turns from diarization, stored as parallel arrays.
+    Sorted array views are built on first use and cached for every consumer.
+    """
+    starts: np.ndarray  # Turn start times (float64)
+    ends: np.ndarray  # Turn end times (float64)
+    speaker_ids: np.ndarray  # Index into labels per turn (int16)
+    labels: List[str]  # Speaker labels in order of first appearance
+    
+    @classmethod
+    def from_turns(cls, turns: List[Tuple[float, float, str]]) -> "DiarizationResult":
+        """
+        Build a result from (start, end, speaker) tuples.
+        
+        Args:
+            turns: Speaker turns with their labels
+            
+        Returns:
+            DiarizationResult with labels numbered by first appearance
+        """
+        labels = list(dict.fromkeys(speaker for _, _, speaker in turns))
+        label_to_id = {label: i for i, label in enumerate(labels)}
+        n = len(turns)
+        return cls(
+            starts=np.fromiter((t[0] for t in turns), dtype=np.float64, count=n),
+            ends=np.fromiter((t[1] for t in turns), dtype=np.float64, count=n),
+            speaker_ids=np.fromiter((label_to_id[t[2]] for t in turns), dtype=np.int16, count=n),
+            labels=labels
+        )
+    
+    def __len__(self) -> int:
+        return self.starts.shape[0]
+    
+    @cached_property
+    def _order(self) -> np.ndarray:
+        """Indices that sort turns by start time."""
+        return np.argsort(self.starts, kind="stable")
+    
+    @cached_property
+    def sorted_starts(self) -> np.ndarray:
+        """Turn start times, ascending."""
+        return self.starts[self._order]
+    
+    @cached_property
+    def sorted_ends(self) -> np.ndarray:
+        """Turn end times, in sorted_starts order."""
+        return self.ends[self._order]
+    
+    @cached_property
+    def sorted_speaker_ids(self) -> np.ndarray:
+        """Speaker id per turn, in sorted_starts order."""
+        return self.speaker_ids[self._order].astype(np.int64)
+    
+    def speech_regions(self, max_gap: float) -> List[Tuple[float, float]]:
+        """
+        Merge all speaker turns into speech regions, ignoring who is speaking.
+        
+        Args:
+            max_gap: Gaps up to this many seconds are bridged
+            
+        Returns:
+            List of (start, end) in seconds, in time order
+        """
+        if not len(self):
+            return []
+        
+        starts = self.sorted_starts
+        reach = np.maximum.accumulate(self.sorted_ends)
+        
+        # A region starts wherever a turn begins after everything before it has ended
+        breaks = np.flatnonzero(starts[1:] > reach[:-1] + max_gap) + 1
+        first = np.concatenate(([0], breaks))
+        last = np.concatenate((breaks - 1, [len(starts) - 1]))
+        
+        return list(zip(starts[first].tolist(), reach[last].tolist()))
 
 
 class DiarizationService:
@@ -80,30 +159,35 @@ class DiarizationService:
         """Check if pipeline is loaded."""
         return cls._pipeline is not None
     
-    @classmethod
-    def diarize(
-        cls,
-        audio_path: Path,
-        num_speakers: Optional[int] = None,
-        min_speakers: int = 1,
-        max_speakers: int = 10
-    ) -> List[SpeakerSegment]:
+    @staticmethod
+    def _annotation_turns(annotation) -> List[Tuple[float, float, str]]:
         """
-        Perform speaker diarization on audio file.
+        Flatten a pyannote Annotation into (start, end, label) tuples in time order.
         
-        Args:
-            audio_path: Path to WAV audio file
-            num_speakers: Exact number of speakers (None for auto-detect)
-            min_speakers: Minimum number of speakers to detect
-            max_speakers: Maximum number of speakers to detect
-            
-        Returns:
-            List of SpeakerSegment with speaker labels
+        Reads the annotation's segment -> {track: label} mapping directly, which
+        skips the per-segment track sort itertracks does for every turn.
+        Falls back to itertracks if the mapping is not there.
         """
+        tracks = getattr(annotation, "_tracks", None)
+        if tracks is None:
+            return [(turn.start, turn.end, speaker) for turn, _, speaker in annotation.itertracks(yield_label=True)]
+        return [
+            (segment.start, segment.end, label)
+            for segment, labels in tracks.items()
+            for label in labels.values()
+        ]
+    
+    @classmethod
+    def _diarize_input(
+        cls,
+        audio_input: Union[str, Dict[str, Any]],
+        num_speakers: Optional[int],
+        min_speakers: int,
+        max_speakers: int
+    ) -> DiarizationResult:
+        """Run the pipeline on a file path or a {"waveform", "sample_rate"} dict (blocking)."""
         pipeline = cls.get_pipeline()
         
-        logger.info(f"Diarizing: {audio_path}")
-        
         # Build parameters
         params = {}
         if num_speakers is not None:
@@ -112,8 +196,14 @@ class DiarizationService:
             params["min_speakers"] = min_speakers
             params["max_speakers"] = max_speakers
         
-        # Run diarization
-        diarization = pipeline(str(audio_path), **params)
+        # Run diarization without autograd bookkeeping; optional FP16 autocast on GPU (off by default)
+        use_fp16 = settings.diarization_fp16 and settings.resolved_device == "cuda"
+        autocast = (
+            torch.autocast(device_type="cuda", dtype=torch.float16)
+            if use_fp16 else contextlib.nullcontext()
+        )
+        with torch.inference_mode(), autocast:
+            diarization = pipeline(audio_input, **params)
         
         # Handle pyannote.audio 4.x breaking change
         # In 4.x, pipeline returns a DiarizeOutput object wrapping the Annotation
@@ -123,24 +213,67 @@ class DiarizationService:
             annotation = diarization.speaker_diarization
             logger.info("Detected pyannote.audio 4.x DiarizeOutput structure")
         
-        # Convert to segments
-        segments = []
-        speaker_map = {}  # Map SPEAKER_XX to Speaker 1, 2, etc.
+        result = DiarizationResult.from_turns(cls._annotation_turns(annotation))
         
-        for turn, _, speaker in annotation.itertracks(yield_label=True):
-            # Create readable speaker label
-            if speaker not in speaker_map:
-                speaker_map[speaker] = f"Speaker {len(speaker_map) + 1}"
-            
-            segments.append(SpeakerSegment(
-                start=turn.start,
-                end=turn.end,
-                speaker=speaker_map[speaker]
-            ))
+        # Map SPEAKER_XX to Speaker 1, 2, etc. (labels are already in first-appearance order)
+        result.labels = [f"Speaker {i + 1}" for i in range(len(result.labels))]
+        
+        logger.info(f"Diarization complete: {len(result)} turns, {len(result.labels)} speakers")
+        
+        return result
+    
+    @classmethod
+    def diarize(
+        cls,
+        audio_path: Path,
+        num_speakers: Optional[int] = None,
+        min_speakers: int = 1,
+        max_speakers: int = 10
+    ) -> DiarizationResult:
+        """
+        Perform speaker diarization on audio file.
         
-        logger.info(f"Diarization complete: {len(segments)} turns, {len(speaker_map)} speakers")
+        Args:
+            audio_path: Path to WAV audio file
+            num_speakers: Exact number of speakers (None for auto-detect)
+            min_speakers: Minimum number of speakers to detect
+            max_speakers: Maximum number of speakers to detect
+            
+        Returns:
+            DiarizationResult with speaker-labelled turns
+        """
+        logger.info(f"Diarizing: {audio_path}")
+        return cls._diarize_input(str(audio_path), num_speakers, min_speakers, max_speakers)
+    
+    @classmethod
+    def diarize_waveform(
+        cls,
+        waveform: torch.Tensor,
+        sample_rate: int = 16000,
+        num_speakers: Optional[int] = None,
+        min_speakers: int = 1,
+        max_speakers: int = 10
+    ) -> DiarizationResult:
+        """
+        Perform speaker diarization on already-decoded audio.
         
-        return segments
+        Args:
+            waveform: (channel, time) float tensor
+            sample_rate: Sample rate of waveform
+            num_speakers: Exact number of speakers (None for auto-detect)
+            min_speakers: Minimum number of speakers to detect
+            max_speakers: Maximum number of speakers to detect
+            
+        Returns:
+            DiarizationResult with speaker-labelled turns
+        """
+        logger.info(f"Diarizing {waveform.shape[-1] / sample_rate:.1f}s of in-memory audio")
+        return cls._diarize_input(
+            {"waveform": waveform, "sample_rate": sample_rate},
+            num_speakers,
+            min_speakers,
+            max_speakers
+        )
     
     @classmethod
     async def diarize_async(
@@ -149,7 +282,7 @@ class DiarizationService:
         num_speakers: Optional[int] = None,
         min_speakers: int = 1,
         max_speakers: int = 10
-    ) -> List[SpeakerSegment]:
+    ) -> DiarizationResult:
         """
         Async wrapper for diarization (runs in thread pool).
         
@@ -160,16 +293,42 @@ class DiarizationService:
             max_speakers: Maximum speakers
             
         Returns:
-            List of SpeakerSegment
+            DiarizationResult
         """
-        import asyncio
-        
         loop = asyncio.get_event_loop()
         return await loop.run_in_executor(
-            None,
+            _DIARIZE_EXEC,
             lambda: cls.diarize(audio_path, num_speakers, min_speakers, max_speakers)
         )
     
+    @classmethod
+    async def diarize_waveform_async(
+        cls,
+        waveform: torch.Tensor,
+        sample_rate: int = 16000,
+        num_speakers: Optional[int] = None,
+        min_speakers: int = 1,
+        max_speakers: int = 10
+    ) -> DiarizationResult:
+        """
+        Async wrapper for in-memory diarization (runs in thread pool).
+        
+        Args:
+            waveform: (channel, time) float tensor
+            sample_rate: Sample rate of waveform
+            num_speakers: Exact number of speakers
+            min_speakers: Minimum speakers
+            max_speakers: Maximum speakers
+            
+        Returns:
+            DiarizationResult
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            _DIARIZE_EXEC,
+            lambda: cls.diarize_waveform(waveform, sample_rate, num_speakers, min_speakers, max_speakers)
+        )
+    
     @classmethod
     def preload_pipeline(cls) -> None:
         """Preload the pipeline during startup."""
@@ -5,13 +5,19 @@ Coordinates transcription and diarization in parallel.
 import time
 import asyncio
 import logging
+from concurrent.futures import Executor
 from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+import torch
 
 from app.core.config import get_settings
-from app.schemas.models import TranscriptionResponse
-from app.services.transcription import TranscriptionService
-from app.services.diarization import DiarizationService
+from app.schemas.models import TranscriptionResponse, TranscriptSegment
+from app.services.transcription import TranscriptionService, WordTimestamps
+from app.services.diarization import DiarizationService, DiarizationResult
 from app.services.alignment import AlignmentService
+from app.services.audio_processor import AudioProcessor
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -25,49 +31,142 @@ class PipelineOrchestrator:
     4. Generate outputs (TXT, SRT)
     """
 
+    @classmethod
+    async def _transcribe_shards(
+        cls,
+        audio: np.ndarray,
+        shards: List[Tuple[float, float]]
+    ) -> WordTimestamps:
+        """
+        Transcribe shards concurrently and stitch words back onto the full timeline.
+        
+        Args:
+            audio: Full decoded 16kHz mono waveform
+            shards: List of (start, end) in seconds from AudioProcessor.split_on_silence
+            
+        Returns:
+            Words of all shards in time order with absolute timestamps
+        """
+        sample_rate = AudioProcessor.TARGET_SAMPLE_RATE
+        results = await asyncio.gather(*(
+            TranscriptionService.transcribe_array_async(
+                audio[int(start * sample_rate):int(end * sample_rate)],
+                sample_rate
+            )
+            for start, end in shards
+        ))
+        
+        return WordTimestamps.concatenate(results, [start for start, _ in shards])
+
+    @classmethod
+    async def _transcribe_and_diarize(
+        cls,
+        audio: np.ndarray,
+        waveform: torch.Tensor
+    ) -> Tuple[WordTimestamps, DiarizationResult]:
+        """Run Whisper on silence-delimited shards and pyannote on the full audio, in parallel."""
+        async def transcribe() -> WordTimestamps:
+            shards = await AudioProcessor.split_on_silence(audio)
+            return await cls._transcribe_shards(audio, shards)
+        
+        # pyannote starts right away; it does not wait for shard boundaries
+        return await asyncio.gather(
+            transcribe(),
+            DiarizationService.diarize_waveform_async(waveform, AudioProcessor.TARGET_SAMPLE_RATE),
+            return_exceptions=False
+        )
+
+    @classmethod
+    async def _diarize_then_transcribe(
+        cls,
+        audio: np.ndarray,
+        waveform: torch.Tensor
+    ) -> Tuple[WordTimestamps, DiarizationResult]:
+        """Run pyannote first, then Whisper only on the speech regions it found."""
+        diarization = await DiarizationService.diarize_waveform_async(waveform, AudioProcessor.TARGET_SAMPLE_RATE)
+        
+        regions = diarization.speech_regions(settings.speech_region_gap_s)
+        if not regions:
+            # Nothing detected as speech: let Whisper decide on the full audio
+            regions = [(0.0, len(audio) / AudioProcessor.TARGET_SAMPLE_RATE)]
+        
+        speech = sum(end - start for start, end in regions)
+        logger.info(f"Transcribing {len(regions)} speech regions ({speech:.1f}s of {len(audio) / AudioProcessor.TARGET_SAMPLE_RATE:.1f}s)")
+        
+        word_timestamps = await cls._transcribe_shards(audio, regions)
+        return word_timestamps, diarization
+
+    @classmethod
+    def _align_and_export(
+        cls,
+        word_timestamps: WordTimestamps,
+        diarization: DiarizationResult,
+        base_filename: str
+    ) -> Tuple[List[TranscriptSegment], int, Path, Path]:
+        """
+        Steps 3-4 (CPU-bound, blocking): align words to speakers and write outputs.
+        
+        Returns:
+            Tuple of (aligned segments, number of speakers, TXT path, SRT path)
+        """
+        # Step 3: Precision alignment
+        logger.info("Step 3/4: Running precision alignment (word-center-based)...")
+        aligned_segments = AlignmentService.align_precision(word_timestamps, diarization)
+        
+        # Step 4: Generate output files (unique speakers are counted in the same pass)
+        logger.info("Step 4/4: Generating export files (TXT, SRT)...")
+        txt_path, srt_path, num_speakers = AlignmentService.generate_outputs(aligned_segments, base_filename)
+        
+        return aligned_segments, num_speakers, txt_path, srt_path
+
     @classmethod
     async def process_audio(
         cls, 
         wav_path: Path, 
-        duration: float
+        duration: float,
+        executor: Optional[Executor] = None
     ) -> TranscriptionResponse:
         """
         Run the full processing pipeline and return the final response.
         Each step is logged for server-side monitoring.
+        
+        Model inference and the alignment/export steps all run in worker
+        threads, so the event loop stays free for other requests.
+        
+        Args:
+            wav_path: Path to the processed WAV file
+            duration: Audio duration in seconds
+            executor: Executor for alignment/export (None for the loop default)
         """
         start_time = time.time()
         
         # Step 1: Pre-processing (Noise Reduction)
         logger.info(f"Step 1/4: Audio pre-processing complete (Noise Reduction: {settings.enable_noise_reduction})")
         
-        # Step 2: Parallel Whisper and Pyannote
-        logger.info(f"Step 2/4: Starting parallel AI processing (Whisper + Pyannote) for {wav_path.name}")
-        
-        transcription_task = TranscriptionService.transcribe_async(wav_path)
-        diarization_task = DiarizationService.diarize_async(wav_path)
+        # Step 2: Whisper and Pyannote
+        # Decode once; Whisper and pyannote share the same in-memory waveform
+        audio = await AudioProcessor.decode_async(wav_path)
+        waveform = torch.from_numpy(audio)[None]  # (1, time) view for pyannote, no copy
         
         try:
-            word_timestamps, speaker_segments = await asyncio.gather(
-                transcription_task,
-                diarization_task,
-                return_exceptions=False
-            )
-            logger.info(f"AI models finished processing: {len(word_timestamps)} words, {len(speaker_segments)} diarization segments")
+            if settings.transcribe_speech_regions:
+                logger.info(f"Step 2/4: Diarizing, then transcribing speech regions (Pyannote -> Whisper) for {wav_path.name}")
+                word_timestamps, diarization = await cls._diarize_then_transcribe(audio, waveform)
+            else:
+                logger.info(f"Step 2/4: Starting parallel AI processing (Whisper + Pyannote) for {wav_path.name}")
+                word_timestamps, diarization = await cls._transcribe_and_diarize(audio, waveform)
+            logger.info(f"AI models finished processing: {len(word_timestamps)} words, {len(diarization)} diarization segments")
         except Exception as e:
             logger.exception("Parallel task failed")
             raise
 
-        # Step 3: Precision alignment
-        logger.info("Step 3/4: Running precision alignment (word-center-based)...")
-        aligned_segments = AlignmentService.align_precision(word_timestamps, speaker_segments)
-        
-        # Count unique speakers
-        speakers = set(seg.speaker for seg in aligned_segments)
-        
-        # Step 4: Generate output files
-        logger.info("Step 4/4: Generating export files (TXT, SRT)...")
+        # Steps 3-4: Alignment and export, off the event loop
         base_filename = wav_path.stem.replace("_processed", "")
-        txt_path, srt_path = AlignmentService.generate_outputs(aligned_segments, base_filename)
+        loop = asyncio.get_running_loop()
+        aligned_segments, num_speakers, txt_path, srt_path = await loop.run_in_executor(
+            executor,
+            lambda: cls._align_and_export(word_timestamps, diarization, base_filename)
+        )
         
         processing_time = time.time() - start_time
         logger.info(f"Pipeline complete for {wav_path.name} in {processing_time:.2f}s")
@@ -77,7 +176,7 @@ class PipelineOrchestrator:
             message="Transcription completed successfully",
             segments=aligned_segments,
             duration=duration,
-            num_speakers=len(speakers),
+            num_speakers=num_speakers,
             processing_time=round(processing_time, 2),
             download_txt=f"/api/download/{txt_path.name}",
             download_srt=f"/api/download/{srt_path.name}"
@@ -3,18 +3,26 @@ Transcription service using faster-whisper.
 Loads the suzii/vi-whisper-large-v3-turbo-v1-ct2 model for Vietnamese STT.
 Returns word-level timestamps for precision alignment.
 """
+import os
+import array
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Union
 from dataclasses import dataclass
 
-from faster_whisper import WhisperModel
+import numpy as np
+from faster_whisper import WhisperModel, BatchedInferencePipeline
 
 from app.core.config import get_settings
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Dedicated pool so Whisper never queues behind unrelated work on the loop's default executor
+_WHISPER_EXEC = ThreadPoolExecutor(max_workers=settings.whisper_num_workers, thread_name_prefix="whisper")
+
 
 @dataclass
 class WordTimestamp:
@@ -24,6 +32,37 @@ class WordTimestamp:
     end: float
 
 
+@dataclass
+class WordTimestamps:
+    """Words of a transcript with their timestamps, stored column-wise."""
+    words: List[str]
+    starts: np.ndarray  # Word start times (float64)
+    ends: np.ndarray  # Word end times (float64)
+    
+    def __len__(self) -> int:
+        return len(self.words)
+    
+    @classmethod
+    def concatenate(cls, parts: List["WordTimestamps"], offsets: List[float]) -> "WordTimestamps":
+        """
+        Join transcripts of consecutive audio slices onto one timeline.
+        
+        Args:
+            parts: Transcripts of each slice, in time order
+            offsets: Start of each slice in seconds, added to its timestamps
+            
+        Returns:
+            WordTimestamps with absolute timestamps
+        """
+        if not parts:
+            return cls(words=[], starts=np.empty(0), ends=np.empty(0))
+        return cls(
+            words=[word for part in parts for word in part.words],
+            starts=np.concatenate([part.starts + offset for part, offset in zip(parts, offsets)]),
+            ends=np.concatenate([part.ends + offset for part, offset in zip(parts, offsets)])
+        )
+
+
 @dataclass
 class TranscriptSegmentRaw:
     """Raw segment from Whisper transcription with word-level data."""
@@ -42,6 +81,7 @@ class TranscriptionService:
     
     _instance: Optional["TranscriptionService"] = None
     _model: Optional[WhisperModel] = None
+    _batched: Optional[BatchedInferencePipeline] = None
     
     def __new__(cls):
         if cls._instance is None:
@@ -65,72 +105,133 @@ class TranscriptionService:
                 device=settings.resolved_device,
                 compute_type=settings.resolved_compute_type,
                 download_root=None,  # Use default HF cache
+                # Let CTranslate2 serve concurrent transcribe calls without reloading weights
+                num_workers=settings.whisper_num_workers,
+                cpu_threads=max(1, (os.cpu_count() or 2) // 2),
             )
             
             logger.info("Whisper model loaded successfully")
         
         return cls._model
     
+    @classmethod
+    def get_batched_pipeline(cls) -> BatchedInferencePipeline:
+        """
+        Get the batched inference wrapper around the loaded model.
+        
+        Returns:
+            BatchedInferencePipeline sharing the model weights
+        """
+        if cls._batched is None:
+            cls._batched = BatchedInferencePipeline(model=cls.get_model())
+        return cls._batched
+    
     @classmethod
     def is_loaded(cls) -> bool:
         """Check if model is loaded."""
         return cls._model is not None
     
     @classmethod
-    def transcribe(
+    def _transcribe_source(
         cls,
-        audio_path: Path,
-        language: str = "vi",
-        initial_prompt: Optional[str] = None
-    ) -> List[WordTimestamp]:
-        """
-        Transcribe audio file with word-level timestamps.
-        
-        Args:
-            audio_path: Path to WAV audio file
-            language: Language code (default: Vietnamese)
-            initial_prompt: Optional prompt for context
-            
-        Returns:
-            List of WordTimestamp with precise timing for each word
-        """
-        model = cls.get_model()
-        
-        logger.info(f"Transcribing: {audio_path}")
-        
-        # Run transcription with word timestamps - CRITICAL for precision alignment
-        segments_generator, info = model.transcribe(
-            str(audio_path),
+        source: Union[str, np.ndarray],
+        language: str,
+        initial_prompt: Optional[str]
+    ) -> WordTimestamps:
+        """Run Whisper on a file path or a 16kHz mono float32 array (blocking)."""
+        options = dict(
             language=language,
             initial_prompt=initial_prompt,
             word_timestamps=True,  # CRITICAL: Enable word-level timestamps
-            vad_filter=True,  # Re-enabled for optimization
+            vad_filter=True,  # Skip silence; also required for batching
             vad_parameters=dict(
                 threshold=settings.vad_threshold,
                 min_speech_duration_ms=settings.vad_min_speech_duration_ms,
                 min_silence_duration_ms=settings.vad_min_silence_duration_ms,
             ),
-            beam_size=5,
-            best_of=5,
+            beam_size=settings.whisper_beam_size,
+            best_of=settings.whisper_beam_size,
         )
         
-        # Extract all words with timestamps
-        all_words = []
+        # Run transcription with word timestamps - CRITICAL for precision alignment
+        if settings.whisper_batch_size > 1:
+            # VAD chunks are grouped into batches of one GPU forward pass each
+            segments_generator, info = cls.get_batched_pipeline().transcribe(
+                source,
+                batch_size=settings.whisper_batch_size,
+                **options
+            )
+        else:
+            segments_generator, info = cls.get_model().transcribe(source, **options)
+        
+        # Extract all words with timestamps into flat columns
+        words = []
+        starts = array.array('d')
+        ends = array.array('d')
         segment_count = 0
         
         for segment in segments_generator:
             segment_count += 1
             if segment.words:
                 for word in segment.words:
-                    all_words.append(WordTimestamp(
-                        word=word.word.strip(),
-                        start=word.start,
-                        end=word.end
-                    ))
+                    words.append(word.word.strip())
+                    starts.append(word.start)
+                    ends.append(word.end)
         
-        logger.info(f"Transcription complete: {segment_count} segments, {len(all_words)} words, detected language: {info.language}")
+        logger.info(f"Transcription complete: {segment_count} segments, {len(words)} words, detected language: {info.language}")
         
-        return all_words
+        return WordTimestamps(
+            words=words,
+            starts=np.frombuffer(starts, dtype=np.float64),
+            ends=np.frombuffer(ends, dtype=np.float64)
+        )
+    
+    @classmethod
+    def transcribe(
+        cls,
+        audio_path: Path,
+        language: str = "vi",
+        initial_prompt: Optional[str] = None
+    ) -> WordTimestamps:
+        """
+        Transcribe audio file with word-level timestamps.
+        
+        Args:
+            audio_path: Path to WAV audio file
+            language: Language code (default: Vietnamese)
+            initial_prompt: Optional prompt for context
+            
+        Returns:
+            WordTimestamps with precise timing for each word
+        """
+        logger.info(f"Transcribing: {audio_path}")
+        return cls._transcribe_source(str(audio_path), language, initial_prompt)
+    
+    @classmethod
+    def transcribe_array(
+        cls,
+        audio: np.ndarray,
+        sample_rate: int = 16000,
+        language: str = "vi",
+        initial_prompt: Optional[str] = None
+    ) -> WordTimestamps:
+        """
+        Transcribe already-decoded audio with word-level timestamps.
+        
+        Args:
+            audio: Mono float32 samples
+            sample_rate: Sample rate of audio (Whisper requires 16kHz)
+            language: Language code (default: Vietnamese)
+            initial_prompt: Optional prompt for context
+            
+        Returns:
+            WordTimestamps with precise timing for each word
+        """
+        if sample_rate != 16000:
+            raise ValueError(f"Whisper expects 16kHz audio, got {sample_rate}Hz")
+        
+        logger.info(f"Transcribing {len(audio) / sample_rate:.1f}s of in-memory audio")
+        return cls._transcribe_source(audio, language, initial_prompt)
     
     @classmethod
     async def transcribe_async(
@@ -138,7 +239,7 @@ class TranscriptionService:
         audio_path: Path,
         language: str = "vi",
         initial_prompt: Optional[str] = None
-    ) -> List[WordTimestamp]:
+    ) -> WordTimestamps:
         """
         Async wrapper for transcription (runs in thread pool).
         
@@ -148,16 +249,40 @@ class TranscriptionService:
             initial_prompt: Optional prompt
             
         Returns:
-            List of WordTimestamp
+            WordTimestamps
         """
-        import asyncio
-        
         loop = asyncio.get_event_loop()
         return await loop.run_in_executor(
-            None,
+            _WHISPER_EXEC,
             lambda: cls.transcribe(audio_path, language, initial_prompt)
         )
     
+    @classmethod
+    async def transcribe_array_async(
+        cls,
+        audio: np.ndarray,
+        sample_rate: int = 16000,
+        language: str = "vi",
+        initial_prompt: Optional[str] = None
+    ) -> WordTimestamps:
+        """
+        Async wrapper for in-memory transcription (runs in thread pool).
+        
+        Args:
+            audio: Mono float32 samples
+            sample_rate: Sample rate of audio
+            language: Language code
+            initial_prompt: Optional prompt
+            
+        Returns:
+            WordTimestamps
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            _WHISPER_EXEC,
+            lambda: cls.transcribe_array(audio, sample_rate, language, initial_prompt)
+        )
+    
     @classmethod
     def preload_model(cls) -> None:
         """Preload the model during startup."""